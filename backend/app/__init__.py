@@ -1,24 +1,68 @@
 import os
-from flask import Flask, send_from_directory
+import orjson
+from flask import Flask, Response, send_from_directory
+from flask.json.provider import JSONProvider
 from app.config import Config
-from app.extensions import db, migrate, bcrypt, cors, jwt, limiter
+from app.extensions import db # Re-exported for `from app import db` (run.py, scripts)
+
+class ORJSONProvider(JSONProvider):
+    # orjson encodes in C (datetimes included) and is several times faster
+    # than the stdlib json module on the large listing payloads
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 def create_app(config_class=Config):
+    # Imported here rather than at module level so `import app` alone (flask
+    # shell, Alembic, seed scripts) doesn't build every extension
+    from app.extensions import migrate, bcrypt, cors, jwt, limiter, cache
+
     app = Flask(__name__)
+    app.json = ORJSONProvider(app) # Replace the default (stdlib) JSON provider
     app.config.from_object(config_class)
 
+    # Ensure the media directory exists (done here, not at config import time,
+    # so CLI tools and tests importing the config don't pay the syscall)
+    os.makedirs(app.config['MEDIA_FOLDER'], exist_ok=True)
+
+    # Behind a reverse proxy, recover the real client IP from the trusted
+    # proxy hops so rate limiting doesn't key on the proxy's address.
+    # Without this (the default), proxy headers are ignored entirely -
+    # they're client-forgeable.
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     # Initialize Flask extensions
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
-    cors.init_app(app) # Enable CORS for all routes by default
+    # Scope CORS to the API and media routes with an explicit origin list and
+    # let browsers cache the preflight for 24h instead of re-asking per request
+    cors_origins = sorted(app.config['CORS_ORIGINS'])
+    cors.init_app(app, resources={
+        r"/api/*": {"origins": cors_origins},
+        r"/media/*": {"origins": cors_origins},
+    }, max_age=86400)
     jwt.init_app(app) # Initialize JWTManager with the app
     limiter.init_app(app) # Initialize Limiter with the app
+    cache.init_app(app) # Initialize the response cache (Redis or SimpleCache)
 
     # Route to serve media files
     @app.route('/media/<path:filename>')
     def serve_media(filename):
-        # Serve files from the MEDIA_FOLDER defined in config.py
+        if app.config['USE_X_ACCEL']:
+            # Hand the transfer off to nginx so the worker isn't pinned
+            # streaming bytes through Python. Requires an internal location:
+            #   location /_protected_media/ { internal; alias /path/to/media/; }
+            response = Response(status=200)
+            response.headers['X-Accel-Redirect'] = f'/_protected_media/{filename}'
+            response.headers['Content-Type'] = '' # Let nginx pick the type
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' # Filenames are UUIDs
+            return response
+        # Development fallback: serve files from the MEDIA_FOLDER defined in config.py
         return send_from_directory(app.config['MEDIA_FOLDER'], filename)
 
     # Register blueprints
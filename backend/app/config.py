@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 # Absolute path to the project root directory
 basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -11,18 +12,53 @@ class Config:
                               'sqlite:///' + os.path.join(basedir, 'app.db') # Explicitly put in project root
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool tuning: pre-ping discards stale connections instead of
+    # failing a request, recycle beats server-side idle timeouts, and LIFO
+    # keeps a small warm set of connections in use
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True, 'pool_recycle': 1800}
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # Sizing only applies to server databases (Postgres/MySQL); the
+        # default pool of 5 queues requests under a multi-worker deployment.
+        # Overflow headroom matches the gthread worker config (2xCPU x 4
+        # threads), so spikes borrow connections instead of queueing.
+        SQLALCHEMY_ENGINE_OPTIONS.update({'pool_size': 20, 'max_overflow': 40, 'pool_use_lifo': True})
+
+    # CORS Configuration
+    # Comma-separated allowed origins; '*' keeps local development open.
+    # Deduplicated into a frozenset once at import rather than per request.
+    CORS_ORIGINS = frozenset(o.strip() for o in os.environ.get('CORS_ORIGINS', '*').split(',') if o.strip())
+
     # JWT Configuration
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secret-jwt-key-change-this'
-    JWT_ACCESS_TOKEN_EXPIRES = os.environ.get('JWT_ACCESS_TOKEN_EXPIRES') or 3600 # 1 hour
+    # Parsed into a timedelta once here, not re-coerced on every token creation
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 3600))) # 1 hour
+
+    # Reverse Proxy Configuration
+    # Number of trusted proxy hops in front of the app (e.g. 1 for the nginx
+    # deployment). When set, ProxyFix rewrites REMOTE_ADDR from the last N
+    # X-Forwarded-For entries - the ones the trusted proxies appended - so
+    # rate limiting keys on the real client IP. 0 (the default) trusts no
+    # proxy headers at all.
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
 
     # Rate Limiting Configuration
-    # Store limits in memory for simplicity (development)
-    # For production, consider 'redis://localhost:6379' or 'memcached://localhost:11211'
-    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or 'memory://'
+    # Point REDIS_URL (e.g. 'redis://localhost:6379/0') at a shared Redis so
+    # limits hold across all workers; memory:// is a dev-only fallback where
+    # each process keeps its own counters
+    REDIS_URL = os.environ.get('REDIS_URL')
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or REDIS_URL or 'memory://'
+
+    # Response Cache Configuration
+    # Shared Redis cache when available, per-process SimpleCache in development
+    CACHE_TYPE = 'RedisCache' if REDIS_URL else 'SimpleCache'
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_DEFAULT_TIMEOUT = 300
     RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT') or '200 per 15 minute' # Default global limit
 
     # Media Storage Configuration
     MEDIA_FOLDER = os.path.join(basedir, 'media') # Store media in a 'media' folder at the project root
-    # Ensure the directory exists when the app starts
-    if not os.path.exists(MEDIA_FOLDER):
-        os.makedirs(MEDIA_FOLDER)
\ No newline at end of file
+    # Set USE_X_ACCEL=1 behind nginx to stream media via X-Accel-Redirect
+    # instead of pushing the bytes through Python
+    USE_X_ACCEL = os.environ.get('USE_X_ACCEL', '0') == '1'
+    # Media filenames are UUIDs, so cached copies never go stale
+    SEND_FILE_MAX_AGE_DEFAULT = 31536000
\ No newline at end of file
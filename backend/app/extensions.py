@@ -1,18 +1,149 @@
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-
-db = SQLAlchemy()
-migrate = Migrate()
-bcrypt = Bcrypt()
-cors = CORS()
-jwt = JWTManager()
-limiter = Limiter(
-    key_func=get_remote_address, # Identify the client (by IP address)
-    default_limits=["200 per 15 minute"], # Set global default
-    storage_uri="memory://" # Default storage, overridden by config.py
-)
\ No newline at end of file
+import asyncio
+import os
+from functools import wraps
+
+# Extension singletons are built lazily via PEP 562 module __getattr__ so that
+# entry points which only need the database handle (flask shell, Alembic,
+# scripts) don't pay the import cost of bcrypt/argon2/redis/limiter/caching.
+# `from app.extensions import db` still works exactly as before; each name is
+# constructed on first access and cached.
+
+# Shared Redis connection URI for rate limiting (and caching, when configured).
+# With an in-memory limiter each gunicorn worker keeps its own counters, so the
+# effective limit is N x the configured value; Redis makes the limits global.
+_storage_uri = os.environ.get('RATELIMIT_STORAGE_URI') or os.environ.get('REDIS_URL') or 'memory://'
+
+_instances = {}
+
+def _get(name):
+    if name not in _instances:
+        _instances[name] = _factories[name]()
+    return _instances[name]
+
+def __getattr__(name):
+    if name in _factories:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _make_db():
+    from flask_sqlalchemy import SQLAlchemy
+    return SQLAlchemy()
+
+def _make_migrate():
+    from flask_migrate import Migrate
+    return Migrate()
+
+def _make_bcrypt():
+    from flask_bcrypt import Bcrypt
+    return Bcrypt() # Kept for verifying legacy '$2b$' hashes
+
+def _make_cors():
+    from flask_cors import CORS
+    return CORS()
+
+def _make_jwt():
+    from flask_jwt_extended import JWTManager
+    return JWTManager()
+
+def _make_cache():
+    from flask_caching import Cache
+    return Cache() # Response cache; backend selected via CACHE_* keys in config.py
+
+def _make_ph():
+    from argon2 import PasswordHasher
+    # Argon2id password hasher: memory-hard and faster per unit of security
+    # than bcrypt, so login/register spend less worker time per hash.
+    # Parameters follow the OWASP password-storage recommendation (46 MiB,
+    # t=3, p=1).
+    return PasswordHasher(time_cost=3, memory_cost=46_080, parallelism=1, hash_len=32)
+
+def _make_redis_pool():
+    if not _storage_uri.startswith('redis'):
+        # Development fallback: per-process memory storage, no shared client
+        return None
+    import redis
+    return redis.ConnectionPool.from_url(_storage_uri, max_connections=32)
+
+def _make_redis_client():
+    pool = _get('redis_pool')
+    if pool is None:
+        return None
+    import redis
+    return redis.Redis(connection_pool=pool)
+
+def _make_hash_pool():
+    from concurrent.futures import ThreadPoolExecutor
+    # argon2-cffi drops the GIL inside its memory-hard loop, so hashing in a
+    # worker thread genuinely overlaps with other request work
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='pwhash')
+
+def hash_password(password):
+    return _get('ph').hash(password)
+
+async def hash_password_async(password):
+    # Run the 100-250ms CPU-bound hash in the pool so async views don't block
+    # the worker for its whole duration
+    return await asyncio.get_running_loop().run_in_executor(_get('hash_pool'), hash_password, password)
+
+async def verify_password_async(stored_hash, password):
+    return await asyncio.get_running_loop().run_in_executor(
+        _get('hash_pool'), verify_password, stored_hash, password)
+
+def verify_password(stored_hash, password):
+    # Returns (ok, needs_rehash). Argon2 hashes verify directly; legacy
+    # bcrypt hashes ('$2b$...') verify through flask-bcrypt and report
+    # needing a rehash so accounts migrate transparently at login.
+    if stored_hash.startswith('$argon2'):
+        from argon2.exceptions import VerifyMismatchError, InvalidHashError
+        ph = _get('ph')
+        try:
+            ph.verify(stored_hash, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False, False
+        return True, ph.check_needs_rehash(stored_hash)
+    ok = _get('bcrypt').check_password_hash(stored_hash, password)
+    return ok, ok
+
+def readonly(fn):
+    # For views that only read: skips the autoflush walk of the session's
+    # dirty set that otherwise precedes every query in the request
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _get('db').session.no_autoflush:
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _rate_limit_key():
+    # Identify the client by IP. Leaner than flask_limiter's
+    # get_remote_address on the per-request hot path: a single environ
+    # lookup. REMOTE_ADDR only - X-Forwarded-For is client-supplied, so
+    # keying on it would let a caller rotate the header to land every
+    # request in a fresh bucket and bypass the limits entirely. Behind
+    # nginx, ProxyFix (see create_app, PROXY_FIX_X_FOR) rewrites
+    # REMOTE_ADDR from the trusted proxy hops before this runs.
+    from flask import request
+    return request.environ.get('REMOTE_ADDR', '127.0.0.1')
+
+def _make_limiter():
+    from flask_limiter import Limiter
+    pool = _get('redis_pool')
+    return Limiter(
+        key_func=_rate_limit_key,
+        default_limits=["200 per 15 minute"], # Set global default
+        storage_uri=_storage_uri, # memory:// in dev, redis:// in production
+        storage_options={'connection_pool': pool} if pool else {}
+    )
+
+_factories = {
+    'db': _make_db,
+    'migrate': _make_migrate,
+    'bcrypt': _make_bcrypt,
+    'cors': _make_cors,
+    'jwt': _make_jwt,
+    'cache': _make_cache,
+    'ph': _make_ph,
+    'hash_pool': _make_hash_pool,
+    'redis_pool': _make_redis_pool,
+    'redis_client': _make_redis_client,
+    'limiter': _make_limiter,
+}
@@ -1,50 +1,133 @@
-from app.extensions import db
 from datetime import datetime
+from decimal import Decimal
+from operator import attrgetter
+from typing import List, Optional
+
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.extensions import db
 
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False) # For hashed passwords
-    first_name = db.Column(db.String(50), nullable=True)
-    last_name = db.Column(db.String(50), nullable=True)
-    phone_number = db.Column(db.String(20), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+class Serializable:
+    # The column-name tuple and attrgetter are compiled once per model class
+    # (see the loop at the bottom of this module), so per-row serialization is
+    # a single zip over precomputed accessors instead of a walk over
+    # __table__.columns for every row.
+    @classmethod
+    def _compile_serializer(cls):
+        cls.__cols__ = tuple(c.name for c in cls.__table__.columns)
+        cls.__getter__ = attrgetter(*cls.__cols__)
+
+    def to_dict(self):
+        cls = type(self)
+        return dict(zip(cls.__cols__, cls.__getter__(self)))
+
+class User(Serializable, db.Model):
+    # eager_defaults fetches server-generated timestamps back with the INSERT
+    # (RETURNING) instead of a follow-up SELECT per row
+    __mapper_args__ = {'eager_defaults': True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(db.String(80), unique=True)
+    email: Mapped[str] = mapped_column(db.String(120), unique=True)
+    password_hash: Mapped[str] = mapped_column(db.String(255)) # For hashed passwords (argon2 or legacy bcrypt)
+    first_name: Mapped[Optional[str]] = mapped_column(db.String(50))
+    last_name: Mapped[Optional[str]] = mapped_column(db.String(50))
+    phone_number: Mapped[Optional[str]] = mapped_column(db.String(20))
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
 
     # Relationship to Listing: A user can have many listings
-    listings = db.relationship('Listing', backref='author', lazy='dynamic', cascade="all, delete-orphan")
+    # lazy='select' (not 'dynamic') so routes can batch-load with selectinload
+    listings: Mapped[List['Listing']] = db.relationship(back_populates='author', lazy='select', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<User {self.username}>'
 
-class Listing(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False) # Foreign key to User
-    title = db.Column(db.String(150), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    price = db.Column(db.Float, nullable=True) # Using Float for prices
-    category = db.Column(db.String(50), nullable=True)
-    location = db.Column(db.String(100), nullable=True)
-    posted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    valid_until = db.Column(db.DateTime, nullable=True)
-    is_active = db.Column(db.Boolean, default=True, nullable=False)
+class Listing(Serializable, db.Model):
+    __mapper_args__ = {'eager_defaults': True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(db.ForeignKey('user.id'), index=True) # Foreign key to User
+    title: Mapped[str] = mapped_column(db.String(150))
+    description: Mapped[str] = mapped_column(db.Text)
+    price: Mapped[Optional[Decimal]] = mapped_column(db.Numeric(10, 2)) # Exact decimal prices (no binary FP rounding)
+    category: Mapped[Optional[str]] = mapped_column(db.String(50))
+    location: Mapped[Optional[str]] = mapped_column(db.String(100))
+    posted_at: Mapped[datetime] = mapped_column(server_default=func.now(), index=True)
+    valid_until: Mapped[Optional[datetime]] = mapped_column()
+    is_active: Mapped[bool] = mapped_column(default=True)
+
+    # Indexes for the hot search filters (category/location lookups were full
+    # scans). The partial indexes cover only active rows - every public search
+    # filters on is_active, so the hot index stays as small as the live set.
+    __table_args__ = (
+        db.Index('ix_listing_category_active', 'category', 'is_active'),
+        # Functional index matching the lower(category) = :x comparison the
+        # search endpoint issues; the raw-column indexes above can't serve it
+        db.Index('ix_listing_category_lower', db.text('lower(category)')),
+        db.Index('ix_listing_location', 'location'),
+        db.Index('ix_listing_active_posted', 'posted_at',
+                 postgresql_where=db.text('is_active'), sqlite_where=db.text('is_active')),
+        db.Index('ix_listing_active_cat_loc', 'category', 'location',
+                 postgresql_where=db.text('is_active'), sqlite_where=db.text('is_active')),
+    )
 
     # Relationship to Media: A listing can have many media items
-    media = db.relationship('Media', backref='listing_owner', lazy='dynamic', cascade="all, delete-orphan")
+    media: Mapped[List['Media']] = db.relationship(back_populates='listing_owner', lazy='select', cascade="all, delete-orphan")
+
+    # The user who posted this listing
+    author: Mapped['User'] = db.relationship(back_populates='listings')
 
     def __repr__(self):
         return f'<Listing {self.title}>'
 
-class Media(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    listing_id = db.Column(db.Integer, db.ForeignKey('listing.id'), nullable=False) # Foreign key to Listing
-    filename = db.Column(db.String(255), nullable=False) # Store the UUID filename
-    file_extension = db.Column(db.String(10), nullable=False)
-    mimetype = db.Column(db.String(50), nullable=False)
-    media_type = db.Column(db.String(20), nullable=False) # 'photo', 'video', 'document'
-    order = db.Column(db.Integer, nullable=True) # For display order
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+class Media(Serializable, db.Model):
+    __mapper_args__ = {'eager_defaults': True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    listing_id: Mapped[int] = mapped_column(db.ForeignKey('listing.id')) # Foreign key to Listing
+    filename: Mapped[str] = mapped_column(db.String(255)) # Store the UUID filename
+    file_extension: Mapped[str] = mapped_column(db.String(10))
+    mimetype: Mapped[str] = mapped_column(db.String(50))
+    # Enum instead of free-form VARCHAR: Postgres stores a compact native
+    # enum, and create_constraint=True emits a CHECK on non-native backends
+    # (SQLite) so bad values are rejected at INSERT time there too. 'image'
+    # is what the upload endpoint writes (and what media URLs/folders use);
+    # 'photo' remains for seed data and client-supplied media payloads.
+    media_type: Mapped[str] = mapped_column(
+        db.Enum('photo', 'image', 'video', 'document', name='media_type_enum', create_constraint=True))
+    order: Mapped[Optional[int]] = mapped_column() # For display order
+    uploaded_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+    # Composite index serves both the per-listing media fetch and its ORDER BY
+    # "order"; the leading column also covers plain listing_id lookups
+    __table_args__ = (
+        db.Index('ix_media_listing_order', 'listing_id', 'order'),
+    )
+
+    # The listing this media item belongs to
+    listing_owner: Mapped['Listing'] = db.relationship(back_populates='media')
 
     def __repr__(self):
-        return f'<Media {self.filename}>'
\ No newline at end of file
+        return f'<Media {self.filename}>'
+
+# Compile the serializer tuples once at import, after the tables exist
+for _model in (User, Listing, Media):
+    _model._compile_serializer()
+
+def top_media_ids(listing_ids, k=3):
+    # Selectable yielding the ids of the first k media rows per listing,
+    # ranked by display order, for the given listings only. Used by the
+    # listing list endpoint to fetch thumbnails for a result page in one
+    # window-function query instead of loading each listing's full media
+    # collection; restricting the window to the fetched listings keeps the
+    # cost at O(k x listings returned) rather than ranking the whole table.
+    rn = db.func.row_number().over(
+        partition_by=Media.listing_id,
+        order_by=Media.order.asc()
+    ).label('rn')
+    sq = db.select(Media.id.label('media_id'), rn).where(
+        Media.listing_id.in_(listing_ids)
+    ).subquery()
+    return db.select(sq.c.media_id).where(sq.c.rn <= k)
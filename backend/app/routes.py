@@ -1,44 +1,63 @@
 import os
+import shutil # Chunked streaming of uploads to disk
 import uuid # uuid for unique filenames
 from flask import Blueprint, jsonify, request, abort, current_app
-from app.models import User, Listing, Media
-from app.extensions import db, bcrypt, jwt, limiter
+from app.models import User, Listing, Media, top_media_ids
+from app.extensions import db, jwt, limiter, cache, readonly, hash_password, hash_password_async, verify_password_async
 from datetime import datetime
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from sqlalchemy import or_ # Import or_ for OR conditions in queries
-from werkzeug.utils import secure_filename # For sanitizing filenames
+from sqlalchemy import or_, case, exists, insert, select, update # Query building for filters and bulk DML
+from sqlalchemy.orm import selectinload, raiseload # Batch eager loading / lazy-load guard
 
 # Create a Blueprint named 'api'
 bp = Blueprint('api', __name__)
 
+@bp.after_request
+def add_conditional_etag(response):
+    # Tag successful GET responses with an ETag so clients that already hold
+    # the payload get a bodyless 304 instead of a full re-send
+    if request.method == 'GET' and response.status_code == 200:
+        response.add_etag()
+        return response.make_conditional(request)
+    return response
+
 # Allowed extensions for file uploads
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi'}
-
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def get_mimetype(filename):
-    file_extension = os.path.splitext(filename)[1].lower()
-    # default mime-type
-    inferred_mimetype = "application/octet-stream"
-    if file_extension in ['.mp4', '.avi', '.mov', '.webm', '.flv']: # Added common video formats
-        inferred_mimetype = f'video/{file_extension.lstrip(".")}'
-        # Special case: If it's .mov, mimetype is often 'video/quicktime'
-        if file_extension == '.mov':
-            inferred_mimetype = 'video/quicktime'
-    elif file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.tif']: # Added common image formats
-        inferred_mimetype = f'image/{file_extension.lstrip(".")}'
-        if file_extension == '.jpeg': # Ensure consistency for jpeg
-            inferred_mimetype = 'image/jpeg'
-        elif file_extension == '.tiff' or file_extension == '.tif':
-            inferred_mimetype = 'image/tiff'
-    elif file_extension in ['.mp3', '.wav', '.ogg', '.flac']:
-        inferred_mimetype = f'audio/{file_extension.lstrip(".")}'
-    elif file_extension == '.pdf':
-        inferred_mimetype = 'application/pdf'
-    # return inferred (or application/octet-stream) mime-type
-    return inferred_mimetype
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'avi'})
+
+# Extension -> mime-type lookup table, replacing the old chain of branches and
+# f-string construction with a single dict probe per file
+_MIME_MAP = {
+    # video formats
+    '.mp4': 'video/mp4', '.avi': 'video/avi', '.mov': 'video/quicktime',
+    '.webm': 'video/webm', '.flv': 'video/flv',
+    # image formats
+    '.jpg': 'image/jpg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+    '.gif': 'image/gif', '.bmp': 'image/bmp', '.webp': 'image/webp',
+    '.tiff': 'image/tiff', '.tif': 'image/tiff',
+    # audio formats
+    '.mp3': 'audio/mp3', '.wav': 'audio/wav', '.ogg': 'audio/ogg', '.flac': 'audio/flac',
+    # documents
+    '.pdf': 'application/pdf',
+}
+
+# How many media items (thumbnails) the listing list endpoint returns per
+# listing; the detail endpoint still returns the full collection
+LIST_MEDIA_PER_LISTING = 3
+
+# Valid media_type values, taken from the enum on the model so the two can't
+# drift apart
+MEDIA_TYPES = frozenset(Media.__table__.c.media_type.type.enums)
+
+def classify(filename):
+    # Single splitext powers the extension allow-list check, the stored
+    # file_extension and the mime-type lookup (the old allowed_file /
+    # get_mimetype pair split the filename three times per upload).
+    # Returns (extension, mimetype), or None when the extension isn't allowed.
+    dot_ext = os.path.splitext(filename)[1].lower()
+    ext = dot_ext[1:]
+    if ext not in ALLOWED_EXTENSIONS:
+        return None
+    return ext, _MIME_MAP.get(dot_ext, 'application/octet-stream')
 
 # Helper function to serialize User objects to a dictionary
 def user_to_dict(user):
@@ -49,61 +68,72 @@ def user_to_dict(user):
         'first_name': user.first_name,
         'last_name': user.last_name,
         'phone_number': user.phone_number,
-        'created_at': user.created_at.isoformat(), # Convert datetime to ISO format string
-        'updated_at': user.updated_at.isoformat()
+        'created_at': user.created_at, # orjson encodes datetimes natively (ISO 8601)
+        'updated_at': user.updated_at
     }
 
 # Helper function to serialize Media objects to a dictionary
 def media_to_dict(media_item):
-    return {
-        'id': media_item.id,
-        'listing_id': media_item.listing_id,
-        'filename': media_item.filename,
-        'file_extension': media_item.file_extension,
-        'mimetype': media_item.mimetype,
-        'media_type': media_item.media_type,
-        'order': media_item.order,
-        'uploaded_at': media_item.uploaded_at.isoformat(),
-        'url': f'/media/{media_item.listing_id}/{media_item.media_type}/{media_item.filename}',
-    }
+    # All Media columns are safe to expose, so use the precompiled column
+    # serializer and add the derived URL (orjson encodes the raw datetime)
+    data = media_item.to_dict()
+    data['url'] = f'/media/{media_item.listing_id}/{media_item.media_type}/{media_item.filename}'
+    return data
 
 # Helper function to serialize Listing objects to a dictionary
-def listing_to_dict(listing):
+def listing_to_dict(listing, media=None):
     author = user_to_dict(listing.author) if listing.author else None
-    media_items = [media_to_dict(m) for m in listing.media.order_by(Media.order.asc()).all()]
+    if media is None:
+        # listing.media is a plain (possibly eager-loaded) collection; sort it in Python
+        media = sorted(listing.media, key=lambda m: (m.order is None, m.order))
+    media_items = [media_to_dict(m) for m in media]
 
     return {
         'id': listing.id,
         'user_id': listing.user_id,
         'title': listing.title,
         'description': listing.description,
-        'price': listing.price,
+        'price': float(listing.price) if listing.price is not None else None, # Numeric column comes back as Decimal
         'category': listing.category,
         'location': listing.location,
-        'posted_at': listing.posted_at.isoformat(),
-        'valid_until': listing.valid_until.isoformat() if listing.valid_until else None,
+        'posted_at': listing.posted_at,
+        'valid_until': listing.valid_until,
         'is_active': listing.is_active,
         'author': author,
         'media': media_items
     }
 
+def invalidate_listings_cache():
+    # The list endpoint caches one entry per query string, so targeted
+    # deletion isn't practical; with a 30s TTL, clearing the cache backend on
+    # any listing/media mutation is simple and plenty cheap.
+    cache.clear()
+
 
 # --- AUTHENTICATION ENDPOINTS ---
 
 @bp.route('/register', methods=['POST'])
 @limiter.limit("5 per hour") # Stricter limit for registration to prevent spam/abuse
-def register():
+async def register():
     data = request.get_json()
 
     if not data or not data.get('username') or not data.get('email') or not data.get('password'):
         return jsonify({'message': 'Missing required fields: username, email, and password'}), 400
 
-    if User.query.filter_by(username=data['username']).first():
+    # Both uniqueness checks in one round-trip, via EXISTS so no User rows
+    # are hydrated just to be discarded
+    taken = db.session.execute(select(
+        exists().where(User.username == data['username']).label('username_taken'),
+        exists().where(User.email == data['email']).label('email_taken')
+    )).one()
+    if taken.username_taken:
         return jsonify({'message': 'Username already exists'}), 409
-    if User.query.filter_by(email=data['email']).first():
+    if taken.email_taken:
         return jsonify({'message': 'Email already registered'}), 409
 
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    # Hash in the shared thread pool so this worker can serve other requests
+    # during the CPU-bound argon2 computation
+    hashed_password = await hash_password_async(data['password'])
 
     new_user = User(
         username=data['username'],
@@ -124,7 +154,7 @@ def register():
 
 @bp.route('/login', methods=['POST'])
 @limiter.limit("10 per minute") # Stricter limit for login to prevent brute-force attacks
-def login():
+async def login():
     username = request.json.get('username', None) # Can also use email
     password = request.json.get('password', None)
 
@@ -135,10 +165,16 @@ def login():
     if not user and '@' in username: # Also try to login with email if username not found
         user = User.query.filter_by(email=username).first()
 
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
+    password_ok, needs_rehash = await verify_password_async(user.password_hash, password) if user else (False, False)
+    if not user or not password_ok:
         # Return a generic error message for security, don't tell if username or password was wrong
         return jsonify({"msg": "Bad username or password"}), 401 # 401 Unauthorized
 
+    if needs_rehash:
+        # Upgrade legacy bcrypt (or outdated argon2) hashes on successful login
+        user.password_hash = await hash_password_async(password)
+        db.session.commit()
+
     # Create an access token for the user
     # Convert user.id to a string before passing it as identity
     access_token = create_access_token(identity=str(user.id)) # 'identity' can be any JSON-serializable data, typically user ID
@@ -149,13 +185,19 @@ def login():
 
 @bp.route('/users', methods=['GET'])
 # @limiter.limit("60 per hour")
+@readonly
 def get_users():
     # In a real app, you might protect this or only allow admin access
-    users = User.query.all()
-    users_data = [user_to_dict(user) for user in users]
+    # Core select: project only the public columns and skip ORM instrumentation
+    # entirely - no identity-map bookkeeping or User objects for a plain list
+    users_data = [row._asdict() for row in db.session.execute(
+        select(User.id, User.username, User.email, User.first_name,
+               User.last_name, User.phone_number, User.created_at, User.updated_at)
+    )]
     return jsonify(users_data)
 
 @bp.route('/users/<int:user_id>', methods=['GET'])
+@readonly
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
     return jsonify(user_to_dict(user))
@@ -181,19 +223,21 @@ def update_user():
 
     # Update fields if they are provided in the request body
     if 'username' in data:
-        # Check if new username is unique and not current user's username
-        if data['username'] != user.username and User.query.filter_by(username=data['username']).first():
+        # Check if new username is unique and not current user's username (EXISTS, no row hydration)
+        if data['username'] != user.username and \
+                db.session.scalar(select(exists().where(User.username == data['username']))):
             return jsonify({'message': 'Username already taken'}), 409
         user.username = data['username']
 
     if 'email' in data:
         # Check if new email is unique and not current user's email
-        if data['email'] != user.email and User.query.filter_by(email=data['email']).first():
+        if data['email'] != user.email and \
+                db.session.scalar(select(exists().where(User.email == data['email']))):
             return jsonify({'message': 'Email already registered'}), 409
         user.email = data['email']
 
     if 'password' in data and data['password']: # Ensure password is not empty
-        user.password_hash = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        user.password_hash = hash_password(data['password'])
 
     if 'first_name' in data:
         user.first_name = data['first_name']
@@ -227,9 +271,16 @@ def delete_user():
 # --- LISTING ENDPOINTS ---
 
 @bp.route('/listings', methods=['GET'])
+@cache.cached(timeout=30, query_string=True) # Key per canonicalized filter set
+@readonly
 def get_listings():
-    # Query all listings and then apply filters
-    listings_query = Listing.query
+    # Query all listings and then apply filters. Authors are batch-loaded in
+    # one extra query via selectinload rather than lazily per listing (N+1).
+    listings_query = Listing.query.options(selectinload(Listing.author))
+    if current_app.config.get('SQLA_RAISELOAD', current_app.debug):
+        # In development, any relationship access not covered by an explicit
+        # eager load raises instead of silently reintroducing N+1 queries
+        listings_query = listings_query.options(raiseload('*'))
 
     # Get search parameters from query string (request.args)
     search_query = request.args.get('q') # General keyword search
@@ -240,16 +291,31 @@ def get_listings():
 
     # Apply filters based on parameters
     if search_query:
-        # Search in title or description (case-insensitive)
-        search_pattern = f"%{search_query}%"
-        listings_query = listings_query.filter(
-            or_(
-                Listing.title.ilike(search_pattern),
-                Listing.description.ilike(search_pattern)
+        if db.engine.dialect.name == 'postgresql':
+            # Full-text search: O(log N) GIN lookup instead of a sequential
+            # per-row substring scan. Index to create alongside:
+            #   CREATE INDEX ix_listing_fts ON listing USING GIN
+            #       (to_tsvector('english', title || ' ' || description));
+            tsvector = db.func.to_tsvector('english', Listing.title + ' ' + Listing.description)
+            listings_query = listings_query.filter(
+                tsvector.op('@@')(db.func.plainto_tsquery('english', search_query))
+            )
+        else:
+            # SQLite fallback: search in title or description (case-insensitive)
+            search_pattern = f"%{search_query}%"
+            listings_query = listings_query.filter(
+                or_(
+                    Listing.title.ilike(search_pattern),
+                    Listing.description.ilike(search_pattern)
+                )
             )
-        )
     if category:
-        listings_query = listings_query.filter(Listing.category.ilike(f"%{category}%"))
+        # Category is a categorical field picked from a fixed list, not free
+        # text: exact (case-normalized) match served by the functional
+        # ix_listing_category_lower index, instead of the sequential scan a
+        # %...% ILIKE pattern forces
+        listings_query = listings_query.filter(
+            db.func.lower(Listing.category) == category.strip().lower())
     if location:
         listings_query = listings_query.filter(Listing.location.ilike(f"%{location}%"))
 
@@ -270,12 +336,30 @@ def get_listings():
 
     # Execute the query
     listings = listings_query.all()
-    listings_data = [listing_to_dict(listing) for listing in listings]
+
+    # One window-function query fetches just the top-K ordered media rows per
+    # listing (thumbnails) - scoped to the listings this search actually
+    # matched, so a filtered result doesn't pay for ranking the whole table
+    media_by_listing = {}
+    if listings:
+        thumb_ids = top_media_ids([listing.id for listing in listings], LIST_MEDIA_PER_LISTING)
+        thumbs = Media.query.filter(Media.id.in_(thumb_ids)) \
+                            .order_by(Media.listing_id, Media.order.asc()).all()
+        for media_item in thumbs:
+            media_by_listing.setdefault(media_item.listing_id, []).append(media_item)
+
+    listings_data = [listing_to_dict(listing, media=media_by_listing.get(listing.id, []))
+                     for listing in listings]
     return jsonify(listings_data)
 
 @bp.route('/listings/<int:listing_id>', methods=['GET'])
+@readonly
 def get_listing(listing_id):
-    listing = Listing.query.get_or_404(listing_id)
+    # Eager-load author and media alongside the listing (3 queries total)
+    listing = Listing.query.options(
+        selectinload(Listing.author),
+        selectinload(Listing.media)
+    ).get_or_404(listing_id)
     return jsonify(listing_to_dict(listing))
 
 @bp.route('/listings', methods=['POST'])
@@ -288,6 +372,15 @@ def create_listing():
     if not data or not data.get('title') or not data.get('description'):
         return jsonify({'message': 'Missing required fields: title and description'}), 400
 
+    # Validate the media payload up front so the transaction below stays short
+    media_payload = data.get('media') if isinstance(data.get('media'), list) else []
+    media_payload = [m for m in media_payload
+                     if all(k in m for k in ['filename', 'file_extension', 'mimetype', 'media_type'])]
+    # Reject unknown media_type values here with a 400 rather than letting
+    # them reach the database (where the enum/CHECK would fail the commit)
+    if any(m['media_type'] not in MEDIA_TYPES for m in media_payload):
+        return jsonify({'message': f"Invalid media_type; must be one of: {', '.join(sorted(MEDIA_TYPES))}"}), 400
+
     new_listing = Listing(
         user_id=current_user_id, # Link listing to the authenticated user
         title=data['title'],
@@ -299,22 +392,23 @@ def create_listing():
         is_active=data.get('is_active', True) # Default to True
     )
     db.session.add(new_listing)
-    db.session.commit()
+    db.session.flush() # Populates new_listing.id without ending the transaction
+
+    db.session.add_all([
+        Media(
+            listing_id=new_listing.id,
+            filename=media_data['filename'],
+            file_extension=media_data['file_extension'],
+            mimetype=media_data['mimetype'],
+            media_type=media_data['media_type'],
+            order=media_data.get('order')
+        )
+        for media_data in media_payload
+    ])
 
-    # If media data is sent, iterate and create Media objects
-    if data.get('media') and isinstance(data['media'], list):
-        for media_data in data['media']:
-            if all(k in media_data for k in ['filename', 'file_extension', 'mimetype', 'media_type']):
-                new_media = Media(
-                    listing_id=new_listing.id,
-                    filename=media_data['filename'],
-                    file_extension=media_data['file_extension'],
-                    mimetype=media_data['mimetype'],
-                    media_type=media_data['media_type'],
-                    order=media_data.get('order')
-                )
-                db.session.add(new_media)
-        db.session.commit() # Commit again for media
+    # A single commit (one fsync) covers the listing and all its media
+    db.session.commit()
+    invalidate_listings_cache()
 
     return jsonify(listing_to_dict(new_listing)), 201
 
@@ -351,6 +445,7 @@ def update_listing(listing_id):
     listing.updated_at = datetime.utcnow()
 
     db.session.commit()
+    invalidate_listings_cache()
     return jsonify(listing_to_dict(listing)), 200 # OK
 
 
@@ -367,18 +462,21 @@ def delete_listing(listing_id):
 
     db.session.delete(listing)
     db.session.commit()
+    invalidate_listings_cache()
 
     return jsonify({'message': 'Listing deleted successfully'}), 204 # No Content
 
 # --- MEDIA ENDPOINTS ---
 
 @bp.route('/media', methods=['GET'])
+@readonly
 def get_all_media():
     all_media = Media.query.all()
     media_data = [media_to_dict(media_item) for media_item in all_media]
     return jsonify(media_data)
 
 @bp.route('/media/<int:media_id>', methods=['GET'])
+@readonly
 def get_media_item(media_id):
     media_item = Media.query.get_or_404(media_id)
     return jsonify(media_to_dict(media_item))
@@ -408,17 +506,21 @@ def upload_listing_media(listing_id):
     if not uploaded_files:
         return jsonify({'message': 'No selected file'}), 400
 
-    uploaded_media_data = []
+    # Starting display order: one aggregate query before the loop instead of a
+    # MAX(order) round-trip per uploaded file
+    base_order = db.session.query(
+        db.func.coalesce(db.func.max(Media.order), -1)
+    ).filter_by(listing_id=listing_id).scalar() + 1
+
+    new_media_rows = []
 
-    for file in uploaded_files:
+    for i, file in enumerate(uploaded_files):
         if file.filename == '':
             return jsonify({'message': 'No selected file for one of the uploads'}), 400
 
-        if file and allowed_file(file.filename):
-            original_filename = secure_filename(file.filename)
-            file_extension = original_filename.rsplit('.', 1)[1].lower()
-            mimetype = get_mimetype(file.filename) #file.mimetype
-            print(f'WTF is the MIMETYPE {mimetype}')
+        classified = classify(file.filename)
+        if file and classified:
+            file_extension, mimetype = classified #file.mimetype
 
             if mimetype.startswith('image/'):
                 media_type = 'image'
@@ -441,30 +543,39 @@ def upload_listing_media(listing_id):
                 os.makedirs(listing_media_dir)
 
             file_path = os.path.join(listing_media_dir, unique_filename)
-            file.save(file_path)
-
-            # Get the current max order for this listing's media
-            max_order_result = db.session.query(db.func.max(Media.order)).filter_by(listing_id=listing_id).scalar()
-            new_order = (max_order_result if max_order_result is not None else -1) + 1 # Start from 0 or 1
-
-            # Save media info to database
-            new_media = Media(
-                listing_id=listing_id,
-                filename=unique_filename, # Store the UUID filename
-                file_extension=file_extension,
-                mimetype=mimetype,
-                media_type=media_type,
-                order=new_order,
-                uploaded_at=datetime.utcnow()
-            )
-            db.session.add(new_media)
-            db.session.flush()
-
-            uploaded_media_data.append(media_to_dict(new_media)) # Use the helper function
+            # Stream straight from the parsed upload to the destination in
+            # 1 MiB chunks; file.save copies through a much smaller buffer,
+            # which matters for multi-hundred-MB videos
+            with open(file_path, 'wb') as dst:
+                shutil.copyfileobj(file.stream, dst, length=1 << 20)
+
+            new_media_rows.append({
+                'listing_id': listing_id,
+                'filename': unique_filename, # Store the UUID filename
+                'file_extension': file_extension,
+                'mimetype': mimetype,
+                'media_type': media_type,
+                'order': base_order + i,
+                'uploaded_at': datetime.utcnow()
+            })
         else:
             return jsonify({'message': f'Unsupported file: {file.filename}'}), 415 # Unsupported File from Extension
 
+    # Core bulk insert: one multi-row INSERT ... RETURNING instead of per-row
+    # ORM unit-of-work bookkeeping; the returned rows are ordered like the
+    # input rows. Plain column rows, not ORM objects - serialized before the
+    # commit, so nothing gets expired and re-SELECTed per row afterwards.
+    returned_rows = db.session.execute(
+        insert(Media).returning(*Media.__table__.c, sort_by_parameter_order=True),
+        new_media_rows
+    ).all()
+    uploaded_media_data = []
+    for row in returned_rows:
+        data = row._asdict()
+        data['url'] = f"/media/{data['listing_id']}/{data['media_type']}/{data['filename']}"
+        uploaded_media_data.append(data)
     db.session.commit()
+    invalidate_listings_cache()
 
     return jsonify({
         'message': 'Files uploaded successfully!',
@@ -514,6 +625,7 @@ def delete_media(media_id):
     # Delete the media record from the database
     db.session.delete(media_item)
     db.session.commit()
+    invalidate_listings_cache()
 
     return jsonify({'message': 'Media deleted successfully'}), 204 # No Content, successful deletion
 
@@ -549,52 +661,45 @@ def media_order(listing_id):
     if not all(isinstance(mid, int) for mid in media_ids_ordered):
         return jsonify({'message': 'Invalid data type in media_ids: all elements must be integers'}), 400
 
+    # Only id membership is needed to validate the reorder, so fetch bare ids
+    # instead of hydrating every Media row through listing.media
+    listing_media_ids = set(db.session.scalars(
+        select(Media.id).where(Media.listing_id == listing_id)))
+
     # Optional but recommended: Check if the number of IDs matches existing media
     # This helps catch cases where IDs are missing or extra IDs are sent.
-    existing_media_count = listing.media.count()
-    if len(media_ids_ordered) != existing_media_count:
+    if len(media_ids_ordered) != len(listing_media_ids):
         # This might be an issue if media was deleted but not yet synced, or extra IDs were sent.
         # If media was deleted client-side, make sure the frontend sends only the remaining IDs.
-        print(f"Warning: Received {len(media_ids_ordered)} media IDs, but listing has {existing_media_count} existing media items.")
+        # Lazy %-formatting: the message is only built when DEBUG logging is on
+        current_app.logger.debug("Received %d media IDs, but listing has %d existing media items.",
+                                 len(media_ids_ordered), len(listing_media_ids))
         # return jsonify({'message': 'Mismatch in media item count'}), 400 # Uncomment to enforce strict match
 
-    # Fetch all media for this listing to efficiently update
-    # Create a dictionary for quick lookup by ID
-    listing_media = {m.id: m for m in listing.media.all()} # .all() here is fine as we need all for comparison
+    # New order per media id. Ids that don't belong to this listing (malicious
+    # or stale client state) are simply dropped rather than updated.
+    case_map = {mid: idx for idx, mid in enumerate(media_ids_ordered) if mid in listing_media_ids}
 
-    updated_count = 0
+    updated_count = len(case_map)
     try:
-        # Iterate through the ordered list and update 'order' for each media item
-        for index, media_id in enumerate(media_ids_ordered):
-            media_item = listing_media.get(media_id) # Get media item by ID from our lookup dict
-
-            # Validate that the media_id belongs to this listing
-            if not media_item or media_item.listing_id != listing.id:
-                # This could happen if a malicious user tries to include a media_id
-                # that doesn't belong to this listing or doesn't exist.
-                # It's important to not update arbitrary media items.
-                print(f"Attempted to update non-existent or unassociated media_id: {media_id}")
-                # Possibly choose to return an error, or just skip it.
-                # Skipping allows partial updates if some IDs are invalid, but success for valid ones.
-                continue
-
-            # Update the order
-            if media_item.order != index: # Only update if order actually changed
-                media_item.order = index
-                updated_count += 1
-                db.session.add(media_item) # Mark for update
+        if case_map:
+            # Single UPDATE ... SET "order" = CASE id WHEN ... END for all rows,
+            # instead of flushing one UPDATE per media item
+            stmt = (
+                update(Media)
+                .where(Media.listing_id == listing_id, Media.id.in_(case_map))
+                .values(order=case(case_map, value=Media.id))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(stmt)
 
         # Commit all changes in a single transaction
         db.session.commit()
-
-        # If strictly enforcing `media_ids_ordered` matches `listing.media.all()`
-        # and some IDs were missing from `media_ids_ordered` that still existed on the listing,
-        # their 'order' values wouldn't be updated, which might be undesired.
-        # The current approach updates only the provided IDs.
+        invalidate_listings_cache()
 
         return jsonify({'message': f'Media order updated successfully. {updated_count} items updated.'}), 200 # Changed to 200 OK
 
     except Exception as e:
         db.session.rollback() # Rollback changes if any error occurs
-        print(f"Error updating media order: {e}")
+        current_app.logger.error("Error updating media order: %s", e)
         return jsonify({'message': f'Internal Server Error: Could not update media order. {str(e)}'}), 500
\ No newline at end of file
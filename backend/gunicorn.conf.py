@@ -0,0 +1,16 @@
+import os
+
+# Production WSGI config: gunicorn -c gunicorn.conf.py run:app
+# (run.py's app.run(debug=True) remains the dev-only entry point)
+
+# Threaded workers sized to the password-hashing workload: argon2/bcrypt
+# release the GIL in their C extensions, so the 100-250ms hashes on
+# login/register overlap across threads and throughput scales with
+# workers x threads rather than workers alone
+workers = (os.cpu_count() or 1) * 2
+threads = 4
+worker_class = 'gthread'
+
+# Import the app before forking so workers share read-only code pages
+# (copy-on-write), cutting per-worker RSS
+preload_app = True